@@ -6,23 +6,60 @@ alexjosephswanson@gmail.com
 Resource: https://hackernoon.com/learn-blockchains-by-building-one-117428612f46
 """
 
+import functools
 import hashlib
-import json
+import logging
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from textwrap import dedent
 from time import time
 from uuid import uuid4
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from urllib.parse import urlparse
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from waitress import serve
+
+import mining
+
+logger = logging.getLogger(__name__)
+
+# Nodes are often registered again with the same address, so parsed addresses are cached.
+_urlparse = functools.lru_cache(maxsize=4096)(urlparse)
+
+# Shared by every consensus pass, so that connections to other nodes stay open from one pass to the next. Connections
+# are kept for up to 1024 nodes, a few per node.
+_session = requests.Session()
+_session.mount('http://', HTTPAdapter(pool_connections=1024, pool_maxsize=4))
 
 
 class Blockchain(object):
 
+    # The most peers fetched from at once during consensus.
+    MAX_FETCH_WORKERS = 32
+
+    # The most transactions that can wait for the next block, besides the miner's reward. This bounds the size of a
+    # block, and with it the time taken to hash one.
+    MAX_TX_PER_BLOCK = 1024
+
+    # The fields new_block gives every block. A block from another node that lacks one is invalid.
+    BLOCK_FIELDS = frozenset(['index', 'timestamp', 'transactions', 'proof', 'previous_hash'])
+
     def __init__(self):
 
         self.chain = []
-        self.current_transactions = []
+
+        # The pending transactions, held column by column until they are committed to a block.
+        self.senders = []
+        self.recipients = []
+        self.amounts = array('q')
+
+        # Guards the chain and the pending transactions, which requests on other threads change. It is reentrant, so
+        # that /mine can hold it from the reward to the new block.
+        self.lock = threading.RLock()
 
         self.nodes = set()
 
@@ -39,24 +76,49 @@ class Blockchain(object):
         """
 
         last_block = chain[0]
+        if not self.BLOCK_FIELDS <= last_block.keys():
+            return False
+
+        # A block orjson cannot serialize, such as one holding an integer wider than 64 bits, cannot be hashed, and no
+        # node could have made it.
+        try:
+            last_hash = self.hash(last_block)
+        except orjson.JSONEncodeError:
+            return False
+
         current_index = 1
 
+        # Check that the hash the block carries, if any, is correct.
+        if last_block.get('hash', last_hash) != last_hash:
+            return False
+
         while current_index < len(chain):
 
             block = chain[current_index]
-            print(f'{last_block}')
-            print(f'{block}')
-            print("\n-----------\n")
+            if not self.BLOCK_FIELDS <= block.keys():
+                return False
+
+            logger.debug("validating block %d", block['index'])
 
             # Check that the hash of the block is correct.
-            if block['previous_hash'] != self.hash(last_block):
+            if block['previous_hash'] != last_hash:
                 return False
 
             # Check that the proof of work is correct.
-            if not self.valid_proof(last_block['previous_hash'], block['proof']):
+            if not self.valid_proof(last_block['proof'], block['proof']):
                 return False
 
+            # Hash each block once, as the next block's predecessor, and check the hash it carries, if any. A peer's
+            # stored hashes are never trusted without recomputing them.
             last_block = block
+            try:
+                last_hash = self.hash(block)
+            except orjson.JSONEncodeError:
+                return False
+
+            if block.get('hash', last_hash) != last_hash:
+                return False
+
             current_index += 1
 
         return True
@@ -69,28 +131,53 @@ class Blockchain(object):
         :return: <bool> True if the chain was replaced, False if not.
         """
 
-        neighbours = self.nodes
-        new_chain = None
+        neighbours = list(self.nodes)
         max_chain_length = len(self.chain)
+        candidates = []
+
+        if not neighbours:
+            return False
+
+        # Grab the chains from all the nodes in the network at once, over the connections kept open to them.
+        with ThreadPoolExecutor(max_workers=min(len(neighbours), self.MAX_FETCH_WORKERS)) as executor:
+            futures = [executor.submit(_session.get, f'http://{node}/chain', timeout=(2, 10)) for node in neighbours]
+
+            for future in as_completed(futures):
+
+                # Skip nodes that are down or too slow to answer.
+                try:
+                    response = future.result()
+                except requests.RequestException:
+                    continue
+
+                if response.status_code == 200:
+
+                    # Skip nodes whose answer is not a chain.
+                    try:
+                        chain = orjson.loads(response.content)['chain']
+                    except (orjson.JSONDecodeError, KeyError, TypeError):
+                        continue
 
-        # Grab and verify the chains from all the nodes in the network.
-        for node in neighbours:
+                    if type(chain) is not list or not chain or not all(type(block) is dict for block in chain):
+                        continue
 
-            response = requests.get(f'http://{node}/chain')
+                    # Only a longer chain can replace ours. The length a node claims is not trusted, so chains are
+                    # measured.
+                    if len(chain) > max_chain_length:
+                        candidates.append(chain)
 
-            if response.status_code == 200:
-                length = response.json()['length']
-                chain = response.json()['chain']
+        # Verify the longest chains first; the first valid one replaces ours. Validation is CPU-bound, so it stays on
+        # this thread.
+        for chain in sorted(candidates, key=len, reverse=True):
+            if self.valid_chain(chain):
 
-                # Check if the length is longer and the chain is valid.
-                if length > max_chain_length and self.valid_chain(chain):
-                    max_chain_length = length
-                    new_chain = chain
+                # Our chain may have grown while the others were fetched and verified.
+                with self.lock:
+                    if len(chain) <= len(self.chain):
+                        return False
 
-        # Replace the chain if a new one was discovered and validated.
-        if new_chain:
-            self.chain = new_chain
-            return True
+                    self.chain = chain
+                    return True
 
         return False
 
@@ -102,91 +189,124 @@ class Blockchain(object):
         :return: None.
         """
 
-        parsed_url = urlparse(address)
-        self.nodes.add(parsed_url.netloc)
+        self.nodes.add(_urlparse(address).netloc)
 
     def new_block(self, previous_hash, proof):
         """
-        Creates a new Block in the Blockchain.
+        Creates a new Block in the Blockchain. The Block is dropped if the last Block no longer has the given hash, as
+        when consensus replaced the chain while the proof was being searched for.
 
         :param proof: <int> The proof given by the Proof of Work algorithm.
         :param previous_hash: (Optional) <str> Hash of previous Block.
-        :return: <dict> New Block.
+        :return: <dict> New Block, or None if it was dropped.
         """
 
-        block = {
-            'index': len(self.chain) + 1,
-            'timestamp': time(),
-            'transactions': self.current_transactions,
-            'proof': proof,
-            'previous_hash': previous_hash or self.hash(self.chain[-1])
-        }
-
-        # Reset the current list of transactions.
-        self.current_transactions = []
-
-        self.chain.append(block)
-        return block
-
-    def new_transaction(self, sender, recipient, amount):
+        with self.lock:
+            if self.chain and previous_hash and previous_hash != self.block_hash(self.chain[-1]):
+                return None
+
+            block = {
+                'index': len(self.chain) + 1,
+                'timestamp': time(),
+                'transactions': [
+                    {'sender': sender, 'recipient': recipient, 'amount': amount}
+                    for sender, recipient, amount in zip(self.senders, self.recipients, self.amounts)
+                ],
+                'proof': proof,
+                'previous_hash': previous_hash or self.block_hash(self.chain[-1])
+            }
+
+            # Store the block's hash so that it is computed only once.
+            block['hash'] = self.hash(block)
+
+            # Reset the pending transactions.
+            self.senders = []
+            self.recipients = []
+            self.amounts = array('q')
+
+            self.chain.append(block)
+            return block
+
+    def new_transaction(self, sender, recipient, amount, reward=False):
         """
-        Adds a new transaction to the list of transactions.
+        Adds a new transaction to the list of transactions, unless MAX_TX_PER_BLOCK transactions already wait for the
+        next Block.
 
         :param sender: <str> Address of the Sender.
         :param recipient: <str> Address of the Recipient.
         :param amount: <int> Amount of the transaction.
-        :return: <int> The index of the Block that will hold this transaction.
+        :param reward: (Optional) <bool> True for the miner's reward, which is added even to a full Block.
+        :return: <int> The index of the Block that will hold this transaction, or None if that Block is full.
         """
 
-        self.current_transactions.append({
-            'sender': sender,
-            'recipient': recipient,
-            'amount': amount,
-        })
+        with self.lock:
+            if not reward and len(self.senders) >= self.MAX_TX_PER_BLOCK:
+                return None
 
-        return self.last_block['index'] + 1
+            self.senders.append(sender)
+            self.recipients.append(recipient)
+            self.amounts.append(amount)
+
+            return self.last_block['index'] + 1
 
     def proof_of_work(self, last_proof):
         """
         Simple Proof of Work Algorithm:
-         - Find a number p' such that hash(pp') contains leading 4 zeroes, where p is the previous p'
+         - Find a number p' such that hash(pp') starts with mining.DIFFICULTY_BITS zero bits, where p is the previous p'
          - p is the previous proof, and p' is the new proof
         :param last_proof: <int>
         :return: <int>
         """
 
-        proof = 0
-        while self.valid_proof(last_proof, proof) is False:
-            proof += 1
-
-        return proof
+        return mining.proof_of_work(last_proof)
 
     @staticmethod
     def valid_proof(last_proof, proof):
         """
-        Validates the Proof: Does hash(last_proof, proof) contain 4 leading zeroes?
+        Validates the Proof: Does hash(last_proof, proof) start with mining.DIFFICULTY_BITS zero bits?
 
         :param last_proof: <int> Previous Proof.
         :param proof: <int> Current Proof.
         :return: <bool> True if correct, False if not.
         """
 
-        guess = f'{last_proof}{proof}'.encode()
-        guess_hash = hashlib.sha256(guess).hexdigest()
-        return guess_hash[:4] == "0000"
+        return mining.valid_proof(last_proof, proof)
 
     @staticmethod
     def hash(block):
         """
-        Creates a SHA-256 hash of a Block.
+        Creates a SHA-256 hash of a Block. The Block's own stored hash, if it has one, is not part of the hash.
+
+        The hash is taken over the Block's canonical form: compact JSON as written by orjson, with sorted keys, no
+        whitespace and UTF-8 strings. Every node must produce byte-identical input for the same Block. For a Block made
+        by new_block that is, on one line:
+
+            {"index":<int>,"previous_hash":<str, or 1 for the genesis Block>,"proof":<int>,"timestamp":<float>,
+             "transactions":[{"amount":<int>,"recipient":<str>,"sender":<str>},...]}
+
+        Floats use the shortest digits that round-trip, and exponents have no '+' or leading zeroes (1e16, 1e-7).
 
         :param block: <dict> The Block.
         :return: <str> The hash.
         """
 
-        block_string = json.dumps(block, sort_keys=True).encode()
+        if 'hash' in block:
+            block = {key: value for key, value in block.items() if key != 'hash'}
+
+        block_string = orjson.dumps(block, option=orjson.OPT_SORT_KEYS)
         return hashlib.sha256(block_string).hexdigest()
 
+    def block_hash(self, block):
+        """
+        Returns the hash of a Block in this node's chain, reading the stored hash when the Block has one. Blocks from
+        older nodes carry no stored hash, so theirs is computed.
+
+        :param block: <dict> The Block.
+        :return: <str> The hash.
+        """
+
+        return block.get('hash') or self.hash(block)
+
     @property
     def last_block(self):
         """
@@ -206,15 +326,33 @@ node_identifier = str(uuid4()).replace('-', '')
 # Instantiate the Blockchain.
 blockchain = Blockchain()
 
+# Only one block is mined at a time.
+mine_lock = threading.Lock()
+
+
+def chain_response(response):
+    """
+    Serializes a response holding a whole chain. These are the largest responses a node sends, so they are encoded
+    with orjson rather than jsonify.
+
+    :param response: <dict> The response body.
+    :return: The JSON response.
+    """
+
+    return Response(orjson.dumps(response), mimetype='application/json')
+
 
 @app.route('/chain', methods=['GET'])
 def full_chain():
+
+    # Read the chain once, since consensus may replace it meanwhile.
+    chain = blockchain.chain
     response = {
-        'chain': blockchain.chain,
-        'length': len(blockchain.chain),
+        'chain': chain,
+        'length': len(chain),
     }
 
-    return jsonify(response), 200
+    return chain_response(response), 200
 
 
 @app.route('/transactions/new', methods=['POST'])
@@ -226,8 +364,17 @@ def new_transaction():
     if not all(k in values for k in required):
         return 'Missing values', 400
 
+    # Amounts are stored as 64-bit integers.
+    amount = values['amount']
+    if type(amount) is not int or not -2 ** 63 <= amount < 2 ** 63:
+        return 'Invalid amount', 400
+
     # Create a new transaction.
-    index = blockchain.new_transaction(values['sender'], values['recipient'], values['amount'])
+    index = blockchain.new_transaction(values['sender'], values['recipient'], amount)
+
+    # Wait for the next block to be mined once this one is full.
+    if index is None:
+        return 'Too many pending transactions', 429
 
     response = {'message': f'Transaction will be added to Block {index}'}
 
@@ -242,22 +389,40 @@ def mine():
     :return: The updated chain and its new block.
     """
 
-    # We run the proof of work algorithm to get the next proof...
-    last_block = blockchain.last_block
-    last_proof = last_block['proof']
-    proof = blockchain.proof_of_work(last_proof)
-
-    # We must receive a reward for finding the proof.
-    # The sender is "0" to signify that this node has mined a new coin.
-    blockchain.new_transaction(
-        sender="0",
-        recipient=node_identifier,
-        amount=1,
-    )
-
-    # Forge the new Block and add it to the Chain.
-    previous_hash = blockchain.hash(last_block)
-    block = blockchain.new_block(proof, previous_hash)
+    # A /mine that arrives during a search is turned away rather than queued, since each one waiting would hold a server
+    # thread for the length of the search.
+    if not mine_lock.acquire(blocking=False):
+        return 'A block is already being mined', 409
+
+    try:
+
+        # We run the proof of work algorithm to get the next proof. The search runs in worker processes spread across
+        # every CPU core, so this thread only waits and the node keeps serving other requests...
+        last_block = blockchain.last_block
+        last_proof = last_block['proof']
+        proof = mining.proof_of_work_parallel(last_proof)
+        previous_hash = blockchain.block_hash(last_block)
+
+        # Hold the chain from here on, so that the reward is only added along with the Block it pays for.
+        with blockchain.lock:
+
+            # Consensus may have replaced the chain during the search, leaving the proof for a Block that is not last.
+            if blockchain.last_block is not last_block:
+                return 'The chain was replaced while mining', 409
+
+            # We must receive a reward for finding the proof.
+            # The sender is "0" to signify that this node has mined a new coin.
+            blockchain.new_transaction(
+                sender="0",
+                recipient=node_identifier,
+                amount=1,
+                reward=True,
+            )
+
+            # Forge the new Block and add it to the Chain.
+            block = blockchain.new_block(previous_hash=previous_hash, proof=proof)
+    finally:
+        mine_lock.release()
 
     response = {
         'message': "New Block forged.",
@@ -324,8 +489,22 @@ def consensus():
             'chain': blockchain.chain
         }
 
-    return jsonify(response), 200
+    return chain_response(response), 200
 
 
 def run(port):
-    app.run(host='0.0.0.0', port=port)
+    """
+    Serves the node with waitress, a production WSGI server, so that requests are handled concurrently.
+
+    :param port: <int> The port to listen on.
+    :return: None.
+    """
+
+    # Fork the mining workers before waitress starts its threads.
+    mining.start_pool()
+
+    serve(app, host='0.0.0.0', port=port, threads=16)
+
+
+if __name__ == '__main__':
+    run(5000)
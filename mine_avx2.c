@@ -0,0 +1,242 @@
+/*
+ * 8-way AVX2 Proof of Work search.
+ *
+ * Hashes eight consecutive guesses "{last}{proof}" at once, one per 32-bit lane of a __m256i, and returns the first
+ * proof in [start, end) whose digest begins with `zero_bits` zero bits. For CPUs without the SHA extensions.
+ *
+ * Build: cc -O3 -shared -fPIC -o mine_avx2.so mine_avx2.c
+ */
+
+#include <stdint.h>
+#include <string.h>
+#include <immintrin.h>
+
+#define AVX2_TARGET __attribute__((target("avx2")))
+
+#define LANES 8
+
+static const uint32_t K[64] = {
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+};
+
+static const uint32_t H0[8] = {
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+};
+
+/* Write the decimal representation of n to out, returning the number of digits written. */
+static int write_dec(uint8_t *out, uint64_t n)
+{
+    uint8_t tmp[20];
+    int len = 0;
+
+    do {
+        tmp[len++] = (uint8_t) ('0' + n % 10);
+        n /= 10;
+    } while (n);
+
+    for (int i = 0; i < len; i++) {
+        out[i] = tmp[len - 1 - i];
+    }
+
+    return len;
+}
+
+AVX2_TARGET
+static inline __m256i rotr(__m256i x, int n)
+{
+    return _mm256_or_si256(_mm256_srli_epi32(x, n), _mm256_slli_epi32(x, 32 - n));
+}
+
+AVX2_TARGET
+static inline __m256i xor3(__m256i a, __m256i b, __m256i c)
+{
+    return _mm256_xor_si256(_mm256_xor_si256(a, b), c);
+}
+
+#define ROTR32(x, n) (((x) >> (n)) | ((x) << (32 - (n))))
+
+/*
+ * Run the first `rounds` rounds of SHA-256 over a block from the standard initial state, giving the working variables
+ * a..h after them. Those rounds only read the first `rounds` message words, so when every guess shares those words
+ * (the digits of the previous proof), this midstate is the same for every guess and is computed once per search.
+ */
+static void sha256_midstate(uint32_t mid[8], const uint8_t block[64], int rounds)
+{
+    uint32_t a = H0[0], b = H0[1], c = H0[2], d = H0[3], e = H0[4], f = H0[5], g = H0[6], h = H0[7];
+
+    for (int i = 0; i < rounds; i++) {
+        uint32_t w = (uint32_t) block[4 * i] << 24 | (uint32_t) block[4 * i + 1] << 16
+                   | (uint32_t) block[4 * i + 2] << 8 | block[4 * i + 3];
+        uint32_t t1 = h + (ROTR32(e, 6) ^ ROTR32(e, 11) ^ ROTR32(e, 25)) + (g ^ (e & (f ^ g))) + K[i] + w;
+        uint32_t t2 = (ROTR32(a, 2) ^ ROTR32(a, 13) ^ ROTR32(a, 22)) + ((a & b) | (c & (a | b)));
+
+        h = g;
+        g = f;
+        f = e;
+        e = d + t1;
+        d = c;
+        c = b;
+        b = a;
+        a = t1 + t2;
+    }
+
+    mid[0] = a;
+    mid[1] = b;
+    mid[2] = c;
+    mid[3] = d;
+    mid[4] = e;
+    mid[5] = f;
+    mid[6] = g;
+    mid[7] = h;
+}
+
+/*
+ * Run the SHA-256 compression function over one 64-byte block in each of the eight lanes. Rounds before `first` are
+ * skipped: `mid` holds the working variables after them, as given by sha256_midstate (or the state itself when
+ * `first` is 0). The state is the chaining value, updated in place.
+ */
+AVX2_TARGET
+static void sha256_8way_transform(__m256i state[8], const __m256i msg[16], const __m256i mid[8], int first)
+{
+    __m256i w[64];
+    __m256i a = mid[0], b = mid[1], c = mid[2], d = mid[3];
+    __m256i e = mid[4], f = mid[5], g = mid[6], h = mid[7];
+
+    for (int i = 0; i < 16; i++) {
+        w[i] = msg[i];
+    }
+
+    for (int i = 16; i < 64; i++) {
+        __m256i s0 = xor3(rotr(w[i - 15], 7), rotr(w[i - 15], 18), _mm256_srli_epi32(w[i - 15], 3));
+        __m256i s1 = xor3(rotr(w[i - 2], 17), rotr(w[i - 2], 19), _mm256_srli_epi32(w[i - 2], 10));
+        w[i] = _mm256_add_epi32(_mm256_add_epi32(w[i - 16], s0), _mm256_add_epi32(w[i - 7], s1));
+    }
+
+    for (int i = first; i < 64; i++) {
+        __m256i S1 = xor3(rotr(e, 6), rotr(e, 11), rotr(e, 25));
+        __m256i ch = _mm256_xor_si256(g, _mm256_and_si256(e, _mm256_xor_si256(f, g)));
+        __m256i t1 = _mm256_add_epi32(_mm256_add_epi32(h, S1),
+                                      _mm256_add_epi32(ch, _mm256_add_epi32(_mm256_set1_epi32((int) K[i]), w[i])));
+        __m256i S0 = xor3(rotr(a, 2), rotr(a, 13), rotr(a, 22));
+        __m256i maj = _mm256_or_si256(_mm256_and_si256(a, b), _mm256_and_si256(c, _mm256_or_si256(a, b)));
+        __m256i t2 = _mm256_add_epi32(S0, maj);
+
+        h = g;
+        g = f;
+        f = e;
+        e = _mm256_add_epi32(d, t1);
+        d = c;
+        c = b;
+        b = a;
+        a = _mm256_add_epi32(t1, t2);
+    }
+
+    state[0] = _mm256_add_epi32(state[0], a);
+    state[1] = _mm256_add_epi32(state[1], b);
+    state[2] = _mm256_add_epi32(state[2], c);
+    state[3] = _mm256_add_epi32(state[3], d);
+    state[4] = _mm256_add_epi32(state[4], e);
+    state[5] = _mm256_add_epi32(state[5], f);
+    state[6] = _mm256_add_epi32(state[6], g);
+    state[7] = _mm256_add_epi32(state[7], h);
+}
+
+/* Return non-zero if the running CPU implements AVX2. */
+int avx2_supported(void)
+{
+    __builtin_cpu_init();
+    return __builtin_cpu_supports("avx2");
+}
+
+/*
+ * Search [start, end) for a proof such that sha256("{last}{proof}") begins with `zero_bits` (at most 64)
+ * zero bits. Returns the first such proof, or -1 if the range holds none.
+ */
+AVX2_TARGET
+int64_t find_nonce_8way(uint64_t last_proof, uint64_t start, uint64_t end, uint8_t zero_bits)
+{
+    uint8_t prefix[20];
+    int prefix_len = write_dec(prefix, last_proof);
+
+    /* Masks over the first two digest words; a lane passes when both masked words are zero. */
+    unsigned z = zero_bits > 64 ? 64 : zero_bits;
+    uint32_t mask0 = z == 0 ? 0 : z >= 32 ? 0xffffffffu : ~(0xffffffffu >> z);
+    uint32_t mask1 = z <= 32 ? 0 : z >= 64 ? 0xffffffffu : ~(0xffffffffu >> (z - 32));
+    const __m256i m0 = _mm256_set1_epi32((int) mask0);
+    const __m256i m1 = _mm256_set1_epi32((int) mask1);
+    const __m256i zero = _mm256_setzero_si256();
+
+    /* Message words transposed so that words[j] holds word j of every lane's block. */
+    uint32_t words[16][LANES];
+    uint8_t block[64];
+
+    memcpy(block, prefix, prefix_len);
+
+    /*
+     * The words made only of the previous proof's digits are the same in every guess, so every hash starts from the
+     * midstate after their rounds.
+     */
+    int first = prefix_len / 4;
+    uint32_t mid_words[8];
+    __m256i mid[8];
+
+    sha256_midstate(mid_words, block, first);
+    for (int j = 0; j < 8; j++) {
+        mid[j] = _mm256_set1_epi32((int) mid_words[j]);
+    }
+
+    for (uint64_t base = start; base < end; base += LANES) {
+        for (int lane = 0; lane < LANES; lane++) {
+            int len = prefix_len + write_dec(block + prefix_len, base + lane);
+            uint64_t bits = (uint64_t) len * 8;
+
+            memset(block + len, 0, 64 - len);
+            block[len] = 0x80;
+            for (int i = 0; i < 8; i++) {
+                block[63 - i] = (uint8_t) (bits >> (8 * i));
+            }
+
+            for (int j = 0; j < 16; j++) {
+                words[j][lane] = (uint32_t) block[4 * j] << 24 | (uint32_t) block[4 * j + 1] << 16
+                               | (uint32_t) block[4 * j + 2] << 8 | block[4 * j + 3];
+            }
+        }
+
+        __m256i msg[16];
+        __m256i state[8];
+
+        for (int j = 0; j < 16; j++) {
+            msg[j] = _mm256_loadu_si256((const __m256i *) words[j]);
+        }
+        for (int j = 0; j < 8; j++) {
+            state[j] = _mm256_set1_epi32((int) H0[j]);
+        }
+
+        sha256_8way_transform(state, msg, mid, first);
+
+        __m256i masked = _mm256_or_si256(_mm256_and_si256(state[0], m0), _mm256_and_si256(state[1], m1));
+        unsigned hits = (unsigned) _mm256_movemask_epi8(_mm256_cmpeq_epi32(masked, zero));
+
+        if (hits) {
+            /* Each lane contributes four mask bits; the lowest set lane is the lowest proof. */
+            uint64_t proof = base + (uint64_t) (__builtin_ctz(hits) / 4);
+            if (proof < end) {
+                return (int64_t) proof;
+            }
+        }
+
+        /* Stop before base wraps around at the top of the nonce space. */
+        if (end - base <= LANES) {
+            break;
+        }
+    }
+
+    return -1;
+}
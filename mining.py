@@ -0,0 +1,360 @@
+"""
+Proof of Work search for the Blockchain.
+
+The hot loop is kept apart from the Flask node so that it can be swapped for native kernels. The compiled kernels are
+optional. A CUDA GPU, driven through the numba kernel in mining_cuda, is used first when there is one. Otherwise a
+shared library is used when it has been built and the CPU has the instructions it needs, then the numba CPU kernel in
+mining_jit, and hashlib when numba is not installed either.
+
+Build the kernels with:
+    cc -O3 -shared -fPIC -o sha256ni.so sha256ni.c
+    cc -O3 -shared -fPIC -o mine_avx2.so mine_avx2.c
+"""
+
+import atexit
+import ctypes
+import hashlib
+import multiprocessing
+import os
+import threading
+
+# The number of leading zero bits a valid proof's hash must have, at most 64. 16 bits is 4 hexadecimal zeroes.
+DIFFICULTY_BITS = 16
+
+# A valid hash's first 64 bits, read as a big-endian integer, are below this target.
+_TARGET = 1 << (64 - DIFFICULTY_BITS)
+
+# The number of nonces handed to a native kernel per call.
+BATCH_SIZE = 1 << 20
+
+# The number of nonces handed to the GPU kernel per call, enough to keep every GPU thread busy.
+GPU_BATCH_SIZE = 1 << 24
+
+# The number of nonces a parallel worker searches between checks for another worker's hit.
+POLL_INTERVAL = 4096
+
+# Native kernels return the proof as a signed 64-bit integer, so they only search below this bound.
+_NATIVE_MAX = (1 << 63) - 1
+
+
+def _load_library(name):
+    """
+    Loads a shared library that sits next to this module.
+
+    :param name: <str> File name of the library.
+    :return: <ctypes.CDLL> The library, or None if it has not been built.
+    """
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+
+    try:
+        return ctypes.CDLL(path)
+    except OSError:
+        return None
+
+
+def _load_kernel(name, supported, search):
+    """
+    Loads a search kernel if it has been built and the CPU supports the instructions it uses.
+
+    Every kernel exports `int <supported>(void)` and `int64_t <search>(last, start, end, zero_bits)`, which returns the
+    first proof in [start, end) whose hash has `zero_bits` leading zero bits, or -1.
+
+    :param name: <str> File name of the library.
+    :param supported: <str> Name of the CPU feature check.
+    :param search: <str> Name of the search function.
+    :return: The search function, or None if unavailable.
+    """
+
+    lib = _load_library(name)
+    if lib is None:
+        return None
+
+    getattr(lib, supported).restype = ctypes.c_int
+    if not getattr(lib, supported)():
+        return None
+
+    kernel = getattr(lib, search)
+    kernel.restype = ctypes.c_int64
+    kernel.argtypes = [ctypes.c_uint64, ctypes.c_uint64, ctypes.c_uint64, ctypes.c_uint8]
+    return kernel
+
+
+def _load_jit_kernel():
+    """
+    Loads the numba-compiled search kernel, which has the same signature as the native kernels.
+
+    :return: The search function, or None if numba is not installed.
+    """
+
+    try:
+        from mining_jit import pow_kernel
+    except ImportError:
+        return None
+
+    return pow_kernel
+
+
+def _load_cuda_kernel():
+    """
+    Loads the CUDA search kernel, which has the same signature as the native kernels.
+
+    :return: The search function, or None if numba is not installed or there is no CUDA GPU.
+    """
+
+    try:
+        from numba import cuda
+        if not cuda.is_available():
+            return None
+        from mining_cuda import pow_kernel
+    except ImportError:
+        return None
+
+    return pow_kernel
+
+
+# The fastest kernel available: a CUDA GPU where there is one, then SHA-NI where the CPU has it, else the 8-way AVX2
+# search, else numba on the CPU.
+_gpu_kernel = _load_cuda_kernel()
+_kernel = (_gpu_kernel
+           or _load_kernel('sha256ni.so', 'sha256ni_supported', 'valid_proof_ni')
+           or _load_kernel('mine_avx2.so', 'avx2_supported', 'find_nonce_8way')
+           or _load_jit_kernel())
+
+
+def _on_gpu():
+    """
+    Checks whether searches run on the GPU.
+
+    :return: <bool> True if the search kernel is the CUDA kernel.
+    """
+
+    # The CUDA kernel is always chosen when it loads.
+    return _gpu_kernel is not None
+
+
+def _native(last_proof, proof=0):
+    """
+    Checks whether a native kernel can take the given values.
+
+    :param last_proof: Previous Proof.
+    :param proof: Current Proof.
+    :return: <bool> True if a native kernel can be used.
+    """
+
+    return (_kernel is not None
+            and type(last_proof) is int and 0 <= last_proof <= _NATIVE_MAX
+            and type(proof) is int and 0 <= proof < _NATIVE_MAX)
+
+
+def _prefix(last_proof):
+    """
+    Hashes the previous Proof's digits, which every guess in a search starts with.
+
+    :param last_proof: Previous Proof.
+    :return: <hashlib.sha256> A hash to be copied and completed with each guess's proof.
+    """
+
+    return hashlib.sha256(str(last_proof).encode())
+
+
+def _valid(prefix, digits):
+    """
+    Validates the Proof against a prefix hash from _prefix.
+
+    :param prefix: <hashlib.sha256> Hash of the previous Proof.
+    :param digits: <bytes> The current Proof's digits, or any bytes-like object holding them.
+    :return: <bool> True if correct, False if not.
+    """
+
+    guess_hash = prefix.copy()
+    guess_hash.update(digits)
+    return int.from_bytes(guess_hash.digest()[:8], 'big') < _TARGET
+
+
+def valid_proof(last_proof, proof):
+    """
+    Validates the Proof: Does hash(last_proof, proof) start with DIFFICULTY_BITS zero bits?
+
+    :param last_proof: <int> Previous Proof.
+    :param proof: <int> Current Proof.
+    :return: <bool> True if correct, False if not.
+    """
+
+    # A kernel launch costs far more than one hash on the CPU.
+    if _native(last_proof, proof) and not _on_gpu():
+        return _kernel(last_proof, proof, proof + 1, DIFFICULTY_BITS) == proof
+
+    return _valid(_prefix(last_proof), str(proof).encode())
+
+
+def _search_range(last_proof, start, end):
+    """
+    Searches [start, end) for a valid proof.
+
+    :param last_proof: <int> Previous Proof.
+    :param start: <int> First proof to try.
+    :param end: <int> Proof to stop before.
+    :return: <int> The lowest valid proof in the range, or -1 if there is none.
+    """
+
+    if _native(last_proof, end):
+        return _kernel(last_proof, start, end, DIFFICULTY_BITS)
+
+    prefix = _prefix(last_proof)
+
+    # The proof's digits are stepped in place, so that only a carry out of the last digit builds new bytes.
+    digits = bytearray(b'%d' % start)
+
+    for proof in range(start, end):
+        if _valid(prefix, digits):
+            return proof
+
+        last_digit = digits[-1]
+        if last_digit != 57:
+            digits[-1] = last_digit + 1
+        else:
+            digits[:] = b'%d' % (proof + 1)
+
+    return -1
+
+
+def proof_of_work(last_proof):
+    """
+    Finds the lowest proof p' such that hash(pp') starts with DIFFICULTY_BITS zero bits, where p is the previous proof.
+
+    :param last_proof: <int> Previous Proof.
+    :return: <int> The new Proof.
+    """
+
+    batch_size = GPU_BATCH_SIZE if _on_gpu() else BATCH_SIZE
+
+    start = 0
+    while True:
+        proof = _search_range(last_proof, start, start + batch_size)
+        if proof >= 0:
+            return proof
+        start += batch_size
+
+
+# State shared by the workers of a parallel search, set up by _init_worker.
+_found = None
+_done = None
+
+# Worker pools by size, each with the state its workers share. A pool is kept from one search to the next, since
+# starting one takes longer than a search at the default difficulty.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _init_worker(found, done):
+    """
+    Hands a parallel search's shared state to a worker process.
+
+    :param found: <multiprocessing.Value> The lowest proof found so far, or -1.
+    :param done: <multiprocessing.Event> Set once any worker has found a proof.
+    :return: None.
+    """
+
+    global _found, _done
+    _found, _done = found, done
+
+
+def _search_stride(last_proof, worker, workers):
+    """
+    Searches every workers-th slice of POLL_INTERVAL nonces, starting from the worker-th slice.
+
+    Once another worker has found a proof, only the slices below it are still searched, so that the parallel search
+    returns the same proof as the serial one.
+
+    :param last_proof: <int> Previous Proof.
+    :param worker: <int> Index of this worker.
+    :param workers: <int> Number of workers in the search.
+    :return: None.
+    """
+
+    start = worker * POLL_INTERVAL
+    while not _done.is_set() or start < _found.value:
+        proof = _search_range(last_proof, start, start + POLL_INTERVAL)
+        if proof >= 0:
+            with _found.get_lock():
+                if _found.value < 0 or proof < _found.value:
+                    _found.value = proof
+            _done.set()
+            return
+        start += workers * POLL_INTERVAL
+
+
+def _pool(workers):
+    """
+    Returns the pool of the given size, starting it on first use.
+
+    Workers are forked, where the platform can fork, since spawn and forkserver run the launching script again in every
+    worker, and a script without a __main__ guard would then start another node in each. See start_pool for when the
+    fork is safe.
+
+    :param workers: <int> Number of worker processes.
+    :return: <tuple> The pool, and the Value and Event its workers share.
+    """
+
+    if workers not in _pools:
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        context = multiprocessing.get_context(method)
+
+        found = context.Value('q', -1)
+        done = context.Event()
+        pool = context.Pool(workers, initializer=_init_worker, initargs=(found, done))
+
+        # Stop the workers while the interpreter is still whole, rather than when the pool is collected at shutdown.
+        atexit.register(pool.terminate)
+
+        _pools[workers] = pool, found, done
+
+    return _pools[workers]
+
+
+def start_pool(workers=None):
+    """
+    Starts the worker pool of proof_of_work_parallel, which its first search would otherwise start.
+
+    A server should call this before it starts any threads. Workers are forked, and a fork copies any lock another
+    thread holds at that moment, which nothing in the child would then release.
+
+    :param workers: (Optional) <int> Number of worker processes, defaults to the number of CPUs.
+    :return: None.
+    """
+
+    if _on_gpu():
+        return
+
+    with _pools_lock:
+        _pool(workers or os.cpu_count() or 1)
+
+
+def proof_of_work_parallel(last_proof, workers=None):
+    """
+    Finds the same proof as proof_of_work, splitting the nonce space across worker processes.
+
+    The search runs in worker processes even when there is a single CPU, so the calling thread only waits on them and
+    never holds the GIL for the length of the search. On a GPU the search runs in the calling thread instead: the GPU
+    already tests nonces in parallel, and the thread only waits on it.
+
+    :param last_proof: <int> Previous Proof.
+    :param workers: (Optional) <int> Number of worker processes, defaults to the number of CPUs.
+    :return: <int> The new Proof.
+    """
+
+    if _on_gpu():
+        return proof_of_work(last_proof)
+
+    workers = workers or os.cpu_count() or 1
+
+    # A pool's workers share one Value and Event, so it runs one search at a time.
+    with _pools_lock:
+        pool, found, done = _pool(workers)
+        found.value = -1
+        done.clear()
+
+        pool.starmap(_search_stride, [(last_proof, worker, workers) for worker in range(workers)])
+
+        return found.value
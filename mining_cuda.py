@@ -0,0 +1,117 @@
+"""
+CUDA Proof of Work search, for mining at high difficulty on a GPU.
+
+Every GPU thread hashes one guess "{last_proof}{proof}", with proof = base + its index in the launch, and the lowest
+valid proof of a launch is kept with an atomic minimum. The SHA-256 device functions are compiled from the CPU kernel in
+mining_jit, whose 32-bit words suit the GPU.
+"""
+
+import types
+
+import numba
+import numpy as np
+from numba import cuda
+
+import mining_jit
+from mining_jit import _H0
+
+# GPU threads per block.
+THREADS_PER_BLOCK = 256
+
+# The most nonces searched by a single kernel launch.
+LAUNCH_SIZE = 1 << 24
+
+# Marks that no thread of a launch found a valid proof.
+_NOT_FOUND = np.iinfo(np.int64).max
+
+
+def _device(func, **helpers):
+    """
+    Compiles a function of the CPU kernel in mining_jit as a CUDA device function, so that the GPU runs the same code.
+
+    :param func: The numba CPU function.
+    :param helpers: The device functions to call in place of the CPU functions of the same names.
+    :return: The device function.
+    """
+
+    py_func = func.py_func
+    namespace = dict(py_func.__globals__, **helpers)
+    return cuda.jit(device=True)(types.FunctionType(py_func.__code__, namespace, py_func.__name__))
+
+
+_rotr = _device(mining_jit._rotr)
+_compress = _device(mining_jit._compress, _rotr=_rotr)
+_write_dec = _device(mining_jit._write_dec)
+
+
+@cuda.jit
+def _search(last_proof, base, count, zero_bits, found):
+    """
+    Tests the proofs [base, base + count), one per thread, lowering found[0] to any valid proof.
+
+    :param last_proof: <int> Previous Proof.
+    :param base: <int> First proof of the launch.
+    :param count: <int> Number of proofs in the launch.
+    :param zero_bits: <int> Number of leading zero bits required.
+    :param found: int64[1] device array holding the lowest valid proof found.
+    :return: None.
+    """
+
+    i = cuda.grid(1)
+    if i >= count:
+        return
+
+    proof = base + i
+    block = cuda.local.array(64, numba.uint8)
+    state = cuda.local.array(8, numba.uint32)
+    w = cuda.local.array(64, numba.uint32)
+
+    for j in range(64):
+        block[j] = 0
+
+    length = _write_dec(block, 0, last_proof)
+    length += _write_dec(block, length, proof)
+    block[length] = 0x80
+    block[62] = (length * 8) >> 8
+    block[63] = (length * 8) & 0xFF
+
+    for j in range(8):
+        state[j] = _H0[j]
+    _compress(state, block, w)
+
+    if zero_bits <= 32:
+        valid = state[0] >> (32 - zero_bits) == 0
+    else:
+        valid = state[0] == 0 and state[1] >> (64 - zero_bits) == 0
+
+    if valid:
+        cuda.atomic.min(found, 0, proof)
+
+
+def pow_kernel(last_proof, start, end, zero_bits):
+    """
+    Searches [start, end) for a proof such that sha256("{last_proof}{proof}") begins with `zero_bits` (at most 64)
+    zero bits, in launches of at most LAUNCH_SIZE nonces.
+
+    :param last_proof: <int> Previous Proof.
+    :param start: <int> First proof to try.
+    :param end: <int> Proof to stop before.
+    :param zero_bits: <int> Number of leading zero bits required.
+    :return: <int> The lowest valid proof in the range, or -1 if there is none.
+    """
+
+    found = cuda.to_device(np.array([_NOT_FOUND], dtype=np.int64))
+    base = start
+
+    while base < end:
+        count = min(LAUNCH_SIZE, end - base)
+        blocks = (count + THREADS_PER_BLOCK - 1) // THREADS_PER_BLOCK
+        _search[blocks, THREADS_PER_BLOCK](last_proof, base, count, zero_bits, found)
+
+        proof = found.copy_to_host()[0]
+        if proof != _NOT_FOUND:
+            return int(proof)
+
+        base += count
+
+    return -1
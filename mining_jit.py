@@ -0,0 +1,149 @@
+"""
+Numba-compiled Proof of Work search, for machines where the native kernels have not been built.
+
+The guess "{last_proof}{proof}" is at most 40 bytes, so it is written straight into a single padded 64-byte SHA-256
+block and hashed by a port of the compression function. Words are held in uint32, and every result is cast back to
+uint32, which wraps it the way a 32-bit register would and lets the compiler keep to 32-bit operations. mining_cuda
+compiles the same functions for the GPU, where 64-bit integer arithmetic is emulated.
+"""
+
+import numba
+import numpy as np
+
+_K = np.array([
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+], dtype=np.uint32)
+
+_H0 = np.array([
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+], dtype=np.uint32)
+
+
+@numba.njit(cache=True)
+def _rotr(x, n):
+    """
+    Rotates a 32-bit word right by n bits.
+    """
+
+    return numba.uint32((x >> n) | (x << (32 - n)))
+
+
+@numba.njit(cache=True)
+def _compress(state, block, w):
+    """
+    Runs the SHA-256 compression function over a 64-byte block, updating the state in place.
+
+    :param state: <np.ndarray> uint32[8] hash state.
+    :param block: <np.ndarray> uint8[64] message block.
+    :param w: <np.ndarray> uint32[64] scratch space for the message schedule.
+    :return: None.
+    """
+
+    for i in range(16):
+        w[i] = numba.uint32((numba.uint32(block[4 * i]) << 24) | (numba.uint32(block[4 * i + 1]) << 16)
+                            | (numba.uint32(block[4 * i + 2]) << 8) | numba.uint32(block[4 * i + 3]))
+
+    for i in range(16, 64):
+        s0 = _rotr(w[i - 15], 7) ^ _rotr(w[i - 15], 18) ^ (w[i - 15] >> 3)
+        s1 = _rotr(w[i - 2], 17) ^ _rotr(w[i - 2], 19) ^ (w[i - 2] >> 10)
+        w[i] = numba.uint32(w[i - 16] + s0 + w[i - 7] + s1)
+
+    a, b, c, d, e, f, g, h = state[0], state[1], state[2], state[3], state[4], state[5], state[6], state[7]
+
+    for i in range(64):
+        s1 = _rotr(e, 6) ^ _rotr(e, 11) ^ _rotr(e, 25)
+        ch = g ^ (e & (f ^ g))
+        t1 = numba.uint32(h + s1 + ch + _K[i] + w[i])
+        s0 = _rotr(a, 2) ^ _rotr(a, 13) ^ _rotr(a, 22)
+        maj = (a & b) | (c & (a | b))
+        t2 = numba.uint32(s0 + maj)
+
+        h = g
+        g = f
+        f = e
+        e = numba.uint32(d + t1)
+        d = c
+        c = b
+        b = a
+        a = numba.uint32(t1 + t2)
+
+    state[0] = numba.uint32(state[0] + a)
+    state[1] = numba.uint32(state[1] + b)
+    state[2] = numba.uint32(state[2] + c)
+    state[3] = numba.uint32(state[3] + d)
+    state[4] = numba.uint32(state[4] + e)
+    state[5] = numba.uint32(state[5] + f)
+    state[6] = numba.uint32(state[6] + g)
+    state[7] = numba.uint32(state[7] + h)
+
+
+@numba.njit(cache=True)
+def _write_dec(buf, offset, n):
+    """
+    Writes the decimal representation of a non-negative integer into a buffer.
+
+    :param buf: <np.ndarray> uint8 buffer.
+    :param offset: <int> Index to write the first digit at.
+    :param n: <int> The integer.
+    :return: <int> The number of digits written.
+    """
+
+    length = 1
+    rest = n // 10
+    while rest:
+        length += 1
+        rest //= 10
+
+    for i in range(offset + length - 1, offset - 1, -1):
+        buf[i] = 48 + n % 10
+        n //= 10
+
+    return length
+
+
+@numba.njit(cache=True)
+def pow_kernel(last_proof, start, end, zero_bits):
+    """
+    Searches [start, end) for a proof such that sha256("{last_proof}{proof}") begins with `zero_bits` (at most 64)
+    zero bits.
+
+    :param last_proof: <int> Previous Proof.
+    :param start: <int> First proof to try.
+    :param end: <int> Proof to stop before.
+    :param zero_bits: <int> Number of leading zero bits required.
+    :return: <int> The lowest valid proof in the range, or -1 if there is none.
+    """
+
+    block = np.zeros(64, dtype=np.uint8)
+    state = np.empty(8, dtype=np.uint32)
+    w = np.empty(64, dtype=np.uint32)
+    prefix_len = _write_dec(block, 0, last_proof)
+
+    for proof in range(start, end):
+        length = prefix_len + _write_dec(block, prefix_len, proof)
+        block[length:] = 0
+        block[length] = 0x80
+        block[62] = (length * 8) >> 8
+        block[63] = (length * 8) & 0xFF
+
+        state[:] = _H0
+        _compress(state, block, w)
+
+        if zero_bits <= 32:
+            if state[0] >> (32 - zero_bits) == 0:
+                return proof
+        elif state[0] == 0 and state[1] >> (64 - zero_bits) == 0:
+            return proof
+
+    return -1
+
+
+# Compile at import so the first /mine does not pay for it.
+pow_kernel(1, 0, 1, 16)
@@ -0,0 +1,118 @@
+/*
+ * SHA-NI accelerated Proof of Work search.
+ *
+ * Hashes the guess "{last}{proof}" for every proof in [start, end) using the x86 SHA extensions
+ * (SHA256RNDS2 / SHA256MSG1 / SHA256MSG2) and returns the first proof whose digest begins with
+ * `zero_bits` zero bits. The guess is at most 40 bytes, so every hash is a single 64-byte block.
+ *
+ * Build: cc -O3 -shared -fPIC -o sha256ni.so sha256ni.c
+ */
+
+#include <stdint.h>
+#include <string.h>
+#include <immintrin.h>
+
+#define SHA256NI_TARGET __attribute__((target("sha,sse4.1")))
+
+static const uint32_t K[64] = {
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+};
+
+/* Write the decimal representation of n to out, returning the number of digits written. */
+static int write_dec(uint8_t *out, uint64_t n)
+{
+    uint8_t tmp[20];
+    int len = 0;
+
+    do {
+        tmp[len++] = (uint8_t) ('0' + n % 10);
+        n /= 10;
+    } while (n);
+
+    for (int i = 0; i < len; i++) {
+        out[i] = tmp[len - 1 - i];
+    }
+
+    return len;
+}
+
+/*
+ * Run the SHA-256 compression function over one padded 64-byte block starting from the standard
+ * initial state, returning the first 64 bits of the digest (words A and B) as a big-endian integer.
+ */
+SHA256NI_TARGET
+static uint64_t sha256ni_block(const uint8_t block[64])
+{
+    const __m128i MASK = _mm_set_epi64x(0x0c0d0e0f08090a0bULL, 0x0405060700010203ULL);
+    const __m128i ABEF_INIT = _mm_set_epi32(0x6a09e667, 0xbb67ae85, 0x510e527f, 0x9b05688c);
+    const __m128i CDGH_INIT = _mm_set_epi32(0x3c6ef372, 0xa54ff53a, 0x1f83d9ab, 0x5be0cd19);
+
+    __m128i state0 = ABEF_INIT;
+    __m128i state1 = CDGH_INIT;
+    __m128i w[4];
+    __m128i msg;
+
+    for (int g = 0; g < 16; g++) {
+        if (g < 4) {
+            w[g] = _mm_shuffle_epi8(_mm_loadu_si128((const __m128i *) (block + 16 * g)), MASK);
+        } else {
+            /* w[g] from w[g-4], w[g-3], w[g-2], w[g-1] held in the rolling window. */
+            __m128i t = _mm_sha256msg1_epu32(w[g & 3], w[(g + 1) & 3]);
+            t = _mm_add_epi32(t, _mm_alignr_epi8(w[(g + 3) & 3], w[(g + 2) & 3], 4));
+            w[g & 3] = _mm_sha256msg2_epu32(t, w[(g + 3) & 3]);
+        }
+
+        msg = _mm_add_epi32(w[g & 3], _mm_loadu_si128((const __m128i *) &K[4 * g]));
+        state1 = _mm_sha256rnds2_epu32(state1, state0, msg);
+        msg = _mm_shuffle_epi32(msg, 0x0E);
+        state0 = _mm_sha256rnds2_epu32(state0, state1, msg);
+    }
+
+    state0 = _mm_add_epi32(state0, ABEF_INIT);
+
+    return ((uint64_t) (uint32_t) _mm_extract_epi32(state0, 3) << 32) | (uint32_t) _mm_extract_epi32(state0, 2);
+}
+
+/* Return non-zero if the running CPU implements the SHA extensions. */
+int sha256ni_supported(void)
+{
+    __builtin_cpu_init();
+    return __builtin_cpu_supports("sha") && __builtin_cpu_supports("sse4.1");
+}
+
+/*
+ * Search [start, end) for a proof such that sha256("{last}{proof}") begins with `zero_bits` (at most 64)
+ * zero bits. Returns the first such proof, or -1 if the range holds none.
+ */
+SHA256NI_TARGET
+int64_t valid_proof_ni(uint64_t last, uint64_t start, uint64_t end, uint8_t zero_bits)
+{
+    uint8_t block[64];
+    int prefix_len = write_dec(block, last);
+    unsigned shift = zero_bits >= 64 ? 0 : 64u - zero_bits;
+
+    for (uint64_t proof = start; proof < end; proof++) {
+        int len = prefix_len + write_dec(block + prefix_len, proof);
+        uint64_t bits = (uint64_t) len * 8;
+
+        memset(block + len, 0, 64 - len);
+        block[len] = 0x80;
+        for (int i = 0; i < 8; i++) {
+            block[63 - i] = (uint8_t) (bits >> (8 * i));
+        }
+
+        uint64_t head = sha256ni_block(block);
+        if (zero_bits == 0 || (shift ? head >> shift : head) == 0) {
+            return (int64_t) proof;
+        }
+    }
+
+    return -1;
+}
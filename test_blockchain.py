@@ -0,0 +1,265 @@
+"""
+Checks the node's endpoints and chain validation through Flask's test client. Every test runs against a fresh
+Blockchain in place of the node's own.
+
+Run with: python -m pytest test_blockchain.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+import pytest
+
+import blockchain as node
+import mining
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    fresh = node.Blockchain()
+    monkeypatch.setattr(node, 'blockchain', fresh)
+    return fresh
+
+
+@pytest.fixture
+def client(chain):
+    with node.app.test_client() as client:
+        yield client
+
+
+def mine(client, blocks):
+    """
+    Mines the given number of blocks.
+
+    :return: <list> A copy of the node's chain, whose blocks can be changed without touching the node's.
+    """
+
+    for _ in range(blocks):
+        assert client.get('/mine').status_code == 200
+
+    return [dict(block) for block in node.blockchain.chain]
+
+
+def test_mined_chain_is_valid(client, chain):
+    blocks = mine(client, 3)
+
+    assert len(blocks) == 4
+    assert all(block['hash'] == chain.hash(block) for block in blocks)
+    assert chain.valid_chain(blocks)
+
+
+def test_wrong_stored_hash_is_rejected(client, chain):
+    blocks = mine(client, 2)
+    blocks[1]['hash'] = '0' * 64
+
+    assert not chain.valid_chain(blocks)
+
+
+def test_tampered_block_keeping_its_stored_hash_is_rejected(client, chain):
+    blocks = mine(client, 2)
+    blocks[1]['transactions'] = [{'sender': '0', 'recipient': 'thief', 'amount': 1000}]
+
+    assert not chain.valid_chain(blocks)
+
+
+def test_legacy_blocks_without_stored_hash_are_accepted(client, chain):
+    blocks = mine(client, 2)
+    for block in blocks:
+        del block['hash']
+
+    assert chain.valid_chain(blocks)
+
+
+def peer_chain(chain, blocks):
+    """
+    Builds the chain of a peer that mined the given number of blocks on top of the genesis block of ours.
+
+    :return: <list> The peer's chain.
+    """
+
+    peer = node.Blockchain()
+    peer.chain = [chain.chain[0]]
+    for _ in range(blocks):
+        peer.new_block(previous_hash=None, proof=mining.proof_of_work(peer.last_block['proof']))
+
+    return peer.chain
+
+
+class PeerResponse(object):
+
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+
+def serve_peers(monkeypatch, chain, bodies):
+    """
+    Registers a peer for each body, and answers their /chain requests with it instead of the network.
+
+    :param bodies: <list> The body each peer answers with, as bytes.
+    """
+
+    answers = {}
+    for number, body in enumerate(bodies):
+        chain.register_node(f'http://peer{number}:5000')
+        answers[f'http://peer{number}:5000/chain'] = body
+
+    monkeypatch.setattr(node._session, 'get', lambda url, timeout: PeerResponse(answers[url]))
+
+
+def post_transaction(client, amount):
+    return client.post('/transactions/new', json={'sender': 'alice', 'recipient': 'bob', 'amount': amount})
+
+
+@pytest.mark.parametrize('amount', [5, 0, -2 ** 63, 2 ** 63 - 1])
+def test_transaction_with_64_bit_amount_is_accepted(client, chain, amount):
+    response = post_transaction(client, amount)
+
+    assert response.status_code == 201
+    assert list(chain.amounts) == [amount]
+
+
+@pytest.mark.parametrize('amount', ['5', 5.0, None, True, 2 ** 63, -2 ** 63 - 1])
+def test_transaction_with_invalid_amount_is_rejected(client, chain, amount):
+    response = post_transaction(client, amount)
+
+    assert response.status_code == 400
+    assert not chain.senders
+
+
+def test_transaction_past_cap_is_refused(client, chain, monkeypatch):
+    monkeypatch.setattr(node.Blockchain, 'MAX_TX_PER_BLOCK', 3)
+
+    assert [post_transaction(client, 1).status_code for _ in range(5)] == [201, 201, 201, 429, 429]
+    assert len(chain.senders) == 3
+
+
+def test_concurrent_transactions_stay_within_cap(chain, monkeypatch):
+    monkeypatch.setattr(node.Blockchain, 'MAX_TX_PER_BLOCK', 64)
+
+    def post(amount):
+        with node.app.test_client() as client:
+            return post_transaction(client, amount).status_code
+
+    with ThreadPoolExecutor(16) as executor:
+        codes = list(executor.map(post, range(500)))
+
+    assert codes.count(201) == 64
+    assert codes.count(429) == 436
+    assert len(chain.senders) == 64
+
+
+def test_full_block_still_pays_reward(client, chain, monkeypatch):
+    monkeypatch.setattr(node.Blockchain, 'MAX_TX_PER_BLOCK', 3)
+    for _ in range(3):
+        post_transaction(client, 1)
+
+    block = client.get('/mine').get_json()
+
+    assert len(block['transactions']) == 4
+    assert block['transactions'][-1] == {'sender': '0', 'recipient': node.node_identifier, 'amount': 1}
+    assert post_transaction(client, 1).status_code == 201
+
+
+def test_mine_during_search_is_refused(client):
+    with node.mine_lock:
+        response = client.get('/mine')
+
+    assert response.status_code == 409
+    assert client.get('/mine').status_code == 200
+
+
+def test_chain_replaced_during_search_drops_mined_block(client, chain, monkeypatch):
+    longer = peer_chain(chain, 2)
+    serve_peers(monkeypatch, chain, [orjson.dumps({'length': len(longer), 'chain': longer})])
+
+    search = mining.proof_of_work_parallel
+
+    def search_during_consensus(last_proof):
+        assert chain.resolve_conflicts()
+        return search(last_proof)
+
+    monkeypatch.setattr(mining, 'proof_of_work_parallel', search_during_consensus)
+
+    assert client.get('/mine').status_code == 409
+    assert chain.chain == longer
+    assert chain.valid_chain(chain.chain)
+    assert not chain.senders
+
+
+def test_new_block_on_stale_hash_is_dropped(client, chain):
+    mine(client, 1)
+    stale_hash = chain.chain[0]['hash']
+
+    assert chain.new_block(previous_hash=stale_hash, proof=0) is None
+    assert len(chain.chain) == 2
+
+
+@pytest.mark.parametrize('index', [0, 1])
+def test_block_with_integer_wider_than_64_bits_is_rejected(client, chain, index):
+    blocks = mine(client, 1)
+    blocks[index]['timestamp'] = 2 ** 64
+
+    assert not chain.valid_chain(blocks)
+
+
+MALFORMED_ANSWERS = [
+    b'not json',
+    b'[1, 2]',
+    b'{"chain": []}',
+    b'{"length": "9", "chain": []}',
+    b'{"length": 9, "chain": []}',
+    b'{"length": 9, "chain": "abc"}',
+    b'{"length": 9, "chain": [1, 2]}',
+    b'{"length": 9, "chain": [{"a": 1}, {"b": 2}]}',
+]
+
+
+@pytest.mark.parametrize('body', MALFORMED_ANSWERS)
+def test_malformed_peer_answer_is_skipped(client, chain, monkeypatch, body):
+    serve_peers(monkeypatch, chain, [body])
+    ours = list(chain.chain)
+
+    response = client.get('/nodes/resolve')
+
+    assert response.status_code == 200
+    assert response.get_json()['message'] == 'The main chain is authoritative'
+    assert chain.chain == ours
+
+
+def test_malformed_peer_answers_do_not_stop_consensus(client, chain, monkeypatch):
+    longer = peer_chain(chain, 2)
+    serve_peers(monkeypatch, chain, MALFORMED_ANSWERS + [orjson.dumps({'length': len(longer), 'chain': longer})])
+
+    assert client.get('/nodes/resolve').get_json()['message'] == 'Our chain was replaced'
+    assert chain.chain == longer
+
+
+@pytest.mark.parametrize('field', sorted(node.Blockchain.BLOCK_FIELDS))
+@pytest.mark.parametrize('index', [0, 1])
+def test_block_missing_field_is_rejected(client, chain, index, field):
+    blocks = mine(client, 1)
+    del blocks[index][field]
+
+    assert not chain.valid_chain(blocks)
+
+
+def test_longest_valid_chain_wins_over_claimed_length(client, chain, monkeypatch):
+    short = peer_chain(chain, 1)
+    longer = peer_chain(chain, 3)
+    serve_peers(monkeypatch, chain, [
+        orjson.dumps({'length': 1000, 'chain': short}),
+        orjson.dumps({'length': 2, 'chain': longer}),
+    ])
+
+    assert chain.resolve_conflicts()
+    assert chain.chain == longer
+
+
+def test_chain_claiming_more_length_than_ours_is_measured(client, chain, monkeypatch):
+    mine(client, 2)
+    ours = list(chain.chain)
+    serve_peers(monkeypatch, chain, [orjson.dumps({'length': 1000, 'chain': peer_chain(chain, 1)})])
+
+    assert not chain.resolve_conflicts()
+    assert chain.chain == ours
@@ -0,0 +1,91 @@
+"""
+Checks every Proof of Work kernel that can be loaded here against hashlib, since the kernels decide which proofs are
+valid. Kernels that have not been built, or whose hardware is missing, are skipped.
+
+Run with: python -m pytest test_mining.py
+"""
+
+import hashlib
+
+import pytest
+
+import mining
+
+KERNELS = {
+    'sha256ni': lambda: mining._load_kernel('sha256ni.so', 'sha256ni_supported', 'valid_proof_ni'),
+    'avx2': lambda: mining._load_kernel('mine_avx2.so', 'avx2_supported', 'find_nonce_8way'),
+    'jit': mining._load_jit_kernel,
+    'cuda': mining._load_cuda_kernel,
+}
+
+LAST_PROOFS = [0, 7, 100, 35293, 2 ** 31, 10 ** 18, 2 ** 63 - 1]
+
+RANGES = [(0, 1), (7, 8), (3, 21), (0, 2000), (2 ** 63 - 100, 2 ** 63 - 1)]
+
+ZERO_BITS = [0, 1, 5, 16]
+
+
+def reference(last_proof, start, end, zero_bits):
+    """
+    Searches [start, end) with hashlib for the first proof whose hash has `zero_bits` leading zero bits.
+
+    :return: <int> The proof, or -1 if there is none.
+    """
+
+    for proof in range(start, end):
+        digest = hashlib.sha256(f'{last_proof}{proof}'.encode()).digest()
+        if int.from_bytes(digest[:8], 'big') >> (64 - zero_bits) == 0:
+            return proof
+
+    return -1
+
+
+@pytest.fixture(params=sorted(KERNELS), scope='module')
+def kernel(request):
+    search = KERNELS[request.param]()
+    if search is None:
+        pytest.skip(f'{request.param} kernel is not available')
+    return search
+
+
+@pytest.mark.parametrize('zero_bits', ZERO_BITS)
+@pytest.mark.parametrize('start, end', RANGES)
+@pytest.mark.parametrize('last_proof', LAST_PROOFS)
+def test_kernel_matches_hashlib(kernel, last_proof, start, end, zero_bits):
+    assert kernel(last_proof, start, end, zero_bits) == reference(last_proof, start, end, zero_bits)
+
+
+@pytest.mark.parametrize('digits', range(1, 20))
+def test_kernel_matches_hashlib_for_every_prefix_length(kernel, digits):
+    # The AVX2 kernel skips the rounds over the words made only of the previous proof's digits, so every length is
+    # checked, on both sides of each 4-byte word boundary.
+    last_proof = int('1234567890123456789'[:digits])
+
+    for zero_bits in (1, 5):
+        assert kernel(last_proof, 0, 500, zero_bits) == reference(last_proof, 0, 500, zero_bits)
+
+
+@pytest.mark.parametrize('last_proof', LAST_PROOFS)
+def test_kernel_finds_proof_at_difficulty(kernel, last_proof):
+    expected = reference(last_proof, 0, 1 << 18, mining.DIFFICULTY_BITS)
+    assert expected >= 0
+    assert kernel(last_proof, 0, 1 << 18, mining.DIFFICULTY_BITS) == expected
+
+
+@pytest.mark.parametrize('last_proof', [100, 35293, 2 ** 63 - 1])
+def test_hashlib_search_matches_reference(monkeypatch, last_proof):
+    monkeypatch.setattr(mining, '_kernel', None)
+
+    assert mining._search_range(last_proof, 95, 1 << 18) == reference(last_proof, 95, 1 << 18, mining.DIFFICULTY_BITS)
+
+
+@pytest.mark.parametrize('last_proof, proof', [(100, 35293), (100, 35292), (2 ** 63 - 1, 0), (2 ** 64, 1)])
+def test_valid_proof_matches_reference(last_proof, proof):
+    expected = reference(last_proof, proof, proof + 1, mining.DIFFICULTY_BITS) == proof
+    assert mining.valid_proof(last_proof, proof) == expected
+
+
+@pytest.mark.parametrize('workers', [1, 2, 3])
+@pytest.mark.parametrize('last_proof', [100, 35293, 2 ** 63 - 1])
+def test_parallel_search_matches_serial(last_proof, workers):
+    assert mining.proof_of_work_parallel(last_proof, workers=workers) == mining.proof_of_work(last_proof)